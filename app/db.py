@@ -1,11 +1,16 @@
 import os
 from pathlib import Path
+from typing import Optional
 
-import psycopg
+from psycopg_pool import AsyncConnectionPool
 
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 SCHEMA_PATH = BASE_DIR / "db" / "schema.sql"
+# Read once at import so init_db does no blocking file I/O on the event loop
+_SCHEMA_SQL = SCHEMA_PATH.read_text(encoding="utf-8")
+
+_pool: Optional[AsyncConnectionPool] = None
 
 
 def get_db_url() -> str:
@@ -15,12 +20,37 @@ def get_db_url() -> str:
     return url
 
 
+def get_pool() -> AsyncConnectionPool:
+    """Process-wide connection pool; opened by init_db() at startup."""
+    global _pool
+    if _pool is None:
+        _pool = AsyncConnectionPool(
+            get_db_url(),
+            min_size=int(os.getenv("DB_POOL_MIN", "2")),
+            max_size=int(os.getenv("DB_POOL_MAX", "10")),
+            # Bound pool.connection() waits so requests error quickly when the DB is down
+            timeout=float(os.getenv("DB_POOL_TIMEOUT", "3")),
+            open=False,
+        )
+    return _pool
+
+
 async def init_db() -> None:
-    db_url = get_db_url()
-    schema_sql = SCHEMA_PATH.read_text(encoding="utf-8")
-    async with await psycopg.AsyncConnection.connect(db_url) as conn:
+    pool = get_pool()
+    # Wait for the first connections so a down/unreachable DB fails startup fast
+    # (the startup hook logs and carries on) instead of stalling on the 30s default
+    await pool.open(wait=True, timeout=float(os.getenv("DB_CONNECT_TIMEOUT", "5")))
+    schema_sql = _SCHEMA_SQL
+    if os.getenv("DEV_RELOAD_SCHEMA"):
+        schema_sql = SCHEMA_PATH.read_text(encoding="utf-8")
+    # pool.connection() commits on clean exit
+    async with pool.connection() as conn:
         async with conn.cursor() as cur:
             await cur.execute(schema_sql)
-        await conn.commit()
 
 
+async def close_db() -> None:
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
@@ -0,0 +1,61 @@
+import gzip
+import hashlib
+from typing import Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+
+def etag_for(body: bytes) -> str:
+    return 'W/"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+
+
+def gzip_body(body: bytes) -> bytes:
+    # mtime=0 keeps the output (and anything derived from it) deterministic
+    return gzip.compress(body, compresslevel=6, mtime=0)
+
+
+def json_response(
+    request: Request, body: bytes, etag: str, max_age: int, swr: int = 0, gzipped: Optional[bytes] = None
+) -> Response:
+    """JSON bytes with ETag/Cache-Control; 304 when the client already has it.
+
+    When a precompressed ``gzipped`` copy is given and the client accepts gzip it
+    is sent as-is; GZipMiddleware leaves responses with Content-Encoding alone.
+    """
+    cc = f"public, max-age={max_age}"
+    if swr:
+        cc += f", stale-while-revalidate={swr}"
+    headers = {"ETag": etag, "Cache-Control": cc, "Vary": "Accept-Encoding"}
+    inm = request.headers.get("if-none-match")
+    if inm and (inm.strip() == "*" or etag in (t.strip() for t in inm.split(","))):
+        return Response(status_code=304, headers=headers)
+    if gzipped is not None and "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=gzipped, media_type="application/json", headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+# Streamed binary proxies: tiles are already compressed and carry upstream validators
+_GZIP_SKIP = ("/api/flood/wms",)
+
+
+class ApiGZipMiddleware:
+    """GZip for the JSON API only (same level as gzip_body).
+
+    Static assets, images and the WMS tile proxy pass through untouched, so
+    their bodies keep matching their (strong) ETags.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024) -> None:
+        self.app = app
+        self.gzip = GZipMiddleware(app, minimum_size=minimum_size, compresslevel=6)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        path = scope.get("path", "") if scope["type"] == "http" else ""
+        if path.startswith("/api/") and not path.startswith(_GZIP_SKIP):
+            await self.gzip(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
@@ -1,14 +1,21 @@
+import hashlib
+import os
 from pathlib import Path
+from typing import Any, Dict
 
-from fastapi import FastAPI
-from fastapi.responses import FileResponse, JSONResponse, Response
+from fastapi import FastAPI, Request
+from fastapi.responses import FileResponse, JSONResponse, ORJSONResponse, Response
 from fastapi.staticfiles import StaticFiles
 import asyncio
+import orjson
 
-from .db import init_db
+from .db import init_db, close_db
+from .http_cache import ApiGZipMiddleware
+from .shared_cache import close_redis
+from .upstream import close_client
 from . import config  # noqa: F401  # ensure .env is loaded early
 from .routes_pins import router as pins_router
-from .routes_refdata import router as refdata_router
+from .routes_refdata import router as refdata_router, start_refresh, stop_refresh
 from .routes_feeds import router as feeds_router
 from .routes_ai import router as ai_router
 
@@ -18,7 +25,9 @@ WEB_DIR = BASE_DIR / "web"
 INDEX_FILE = WEB_DIR / "index.html"
 
 
-app = FastAPI(title="ReliefLink API", version="0.1.0")
+app = FastAPI(title="ReliefLink API", version="0.1.0", default_response_class=ORJSONResponse)
+# Compresses JSON API responses; precompressed refdata responses pass through untouched
+app.add_middleware(ApiGZipMiddleware, minimum_size=1024)
 app.include_router(pins_router)
 app.include_router(refdata_router)
 app.include_router(feeds_router)
@@ -35,34 +44,57 @@ def index() -> FileResponse:
     return FileResponse(INDEX_FILE)
 
 
-@app.get("/manifest.json")
-def manifest() -> FileResponse:
-    return FileResponse(WEB_DIR / "manifest.json")
-
-
-@app.get("/sw.js")
-def service_worker() -> FileResponse:
-    return FileResponse(WEB_DIR / "sw.js")
+def _load_asset(path: Path, media_type: str) -> Dict[str, Any]:
+    body = path.read_bytes()
+    return {"body": body, "media_type": media_type, "etag": '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'}
 
 
-@app.get("/favicon.ico")
-def favicon() -> FileResponse:
+def _favicon_asset() -> Dict[str, Any]:
     # Prefer custom SVG/PNG in data/, then web/static, else default SVG
     data_svg = BASE_DIR / "data" / "helpier icon.svg"
     if data_svg.exists():
-        return FileResponse(data_svg, media_type="image/svg+xml")
+        return _load_asset(data_svg, "image/svg+xml")
     data_png = BASE_DIR / "data" / "helpie.png"
     if data_png.exists():
-        return FileResponse(data_png, media_type="image/png")
+        return _load_asset(data_png, "image/png")
     static_png = WEB_DIR / "static" / "helpie.png"
     if static_png.exists():
-        return FileResponse(static_png, media_type="image/png")
-    return FileResponse(WEB_DIR / "static" / "icons" / "icon.svg", media_type="image/svg+xml")
+        return _load_asset(static_png, "image/png")
+    return _load_asset(WEB_DIR / "static" / "icons" / "icon.svg", "image/svg+xml")
 
 
-@app.get("/config.js")
-def config_js() -> Response:
-    import os
+# Small, deploy-static assets: read once at import and served from memory
+_MANIFEST = _load_asset(WEB_DIR / "manifest.json", "application/json")
+_SERVICE_WORKER = _load_asset(WEB_DIR / "sw.js", "application/javascript")
+_FAVICON = _favicon_asset()
+_LONG_CACHE = "public, max-age=86400"
+# Browsers must revalidate the worker script so new deploys are picked up
+_REVALIDATE = "no-cache"
+
+
+def _asset_response(request: Request, asset: Dict[str, Any], cache_control: str) -> Response:
+    headers = {"ETag": asset["etag"], "Cache-Control": cache_control}
+    if request.headers.get("if-none-match") == asset["etag"]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=asset["body"], media_type=asset["media_type"], headers=headers)
+
+
+@app.get("/manifest.json")
+def manifest(request: Request) -> Response:
+    return _asset_response(request, _MANIFEST, _LONG_CACHE)
+
+
+@app.get("/sw.js")
+def service_worker(request: Request) -> Response:
+    return _asset_response(request, _SERVICE_WORKER, _REVALIDATE)
+
+
+@app.get("/favicon.ico")
+def favicon(request: Request) -> Response:
+    return _asset_response(request, _FAVICON, _LONG_CACHE)
+
+
+def _config_js_body() -> bytes:
     cfg = {
         "MAPTILER_KEY": os.getenv("MAPTILER_KEY", ""),
         "HOUSTON_311_URL": os.getenv("HOUSTON_311_URL", ""),
@@ -71,8 +103,16 @@ def config_js() -> Response:
         "FLOOD_ARCGIS_URL": os.getenv("FLOOD_ARCGIS_URL", ""),
         "FLOOD_ARCGIS_LAYERS": os.getenv("FLOOD_ARCGIS_LAYERS", "0,1,6,7,8,9,10"),
     }
-    body = "window.__CONFIG__ = " + __import__("json").dumps(cfg) + ";"
-    return Response(content=body, media_type="application/javascript")
+    return b"window.__CONFIG__ = " + orjson.dumps(cfg) + b";"
+
+
+# Env is fixed for the life of the process (.env is loaded by .config above)
+_CONFIG_JS_BODY = _config_js_body()
+
+
+@app.get("/config.js")
+def config_js() -> Response:
+    return Response(content=_CONFIG_JS_BODY, media_type="application/javascript", headers={"Cache-Control": "public, max-age=300"})
 
 
 # Mount static directory for future assets (icons, manifest, etc.)
@@ -89,5 +129,15 @@ async def on_startup() -> None:
     except Exception as exc:
         # Don't crash on local dev without DB; just log
         print("[startup] DB init skipped/error:", exc)
+    # Keep /api/shelters and /api/food pre-built in the background
+    start_refresh()
+
+
+@app.on_event("shutdown")
+async def on_shutdown() -> None:
+    await stop_refresh()
+    await close_db()
+    await close_redis()
+    await close_client()
 
 
@@ -1,19 +1,19 @@
-from typing import List, Optional, Literal
+from typing import Annotated, List, Optional, Literal
 from datetime import datetime
-from pydantic import BaseModel, Field, constr
+from pydantic import BaseModel, Field, StringConstraints
 
 
-Category = constr(strip_whitespace=True, min_length=2, max_length=32)
+Category = Annotated[str, StringConstraints(strip_whitespace=True, min_length=2, max_length=32)]
 
 
 class PinCreate(BaseModel):
     kind: Literal["need", "offer"]
     categories: List[Category] = Field(min_length=1, max_length=5)
-    title: Optional[constr(max_length=80)] = None
-    body: constr(min_length=1, max_length=240)
+    title: Optional[Annotated[str, StringConstraints(max_length=80)]] = None
+    body: Annotated[str, StringConstraints(min_length=1, max_length=240)]
     lat: float
     lng: float
-    author_anon_id: constr(min_length=3, max_length=40)
+    author_anon_id: Annotated[str, StringConstraints(min_length=3, max_length=40)]
     urgency: int = Field(2, ge=1, le=3)
 
 
@@ -33,8 +33,8 @@ class PinOut(BaseModel):
 
 
 class CommentCreate(BaseModel):
-    body: constr(min_length=1, max_length=200)
-    author_anon_id: constr(min_length=3, max_length=40)
+    body: Annotated[str, StringConstraints(min_length=1, max_length=200)]
+    author_anon_id: Annotated[str, StringConstraints(min_length=3, max_length=40)]
 
 
 class CommentOut(BaseModel):
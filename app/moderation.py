@@ -1,34 +1,127 @@
 import re
 import time
-from typing import Dict
+from typing import Dict, Tuple
 from fastapi import HTTPException, Request
 
+from . import shared_cache
+
+
+try:
+    import ahocorasick  # optional: pyahocorasick C extension
+except Exception:
+    ahocorasick = None
+
+try:
+    import re2  # optional: RE2 (linear-time DFA) bindings
+except Exception:
+    re2 = None
+
 
 _bad_words = {"fuck","shit","bitch","asshole","bastard"}
-_regex = re.compile(r"(" + r"|".join(re.escape(w) for w in _bad_words) + r")", re.IGNORECASE)
+# Every match must start with one of these; text without any can't match
+_first_chars = frozenset(c for w in _bad_words for c in (w[0], w[0].upper()))
+
+
+def _trie_pattern(words) -> str:
+    """Build a prefix-shared alternation, e.g. b(?:astard|itch)."""
+    trie: Dict[str, dict] = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def walk(node: Dict[str, dict]) -> str:
+        alts = [re.escape(ch) + walk(node[ch]) for ch in sorted(k for k in node if k)]
+        if not alts:
+            return ""
+        if len(alts) == 1 and "" not in node:
+            return alts[0]
+        group = "(?:" + "|".join(alts) + ")"
+        return group + "?" if "" in node else group
+
+    return walk(trie)
+
+
+# Inline (?i) so the same pattern compiles under both RE2 and stdlib re
+_pattern = "(?i)" + _trie_pattern(_bad_words)
+_regex = re2.compile(_pattern) if re2 is not None else re.compile(_pattern)
+
+# Single-pass Aho-Corasick automaton over the word list when available;
+# otherwise redact_profanity uses the regex above.
+_automaton = None
+if ahocorasick is not None:
+    _automaton = ahocorasick.Automaton()
+    for _w in _bad_words:
+        _automaton.add_word(_w, len(_w))
+    _automaton.make_automaton()
+
+
+def _star(m: "re.Match[str]") -> str:
+    return m.group(0)[0] + "***"
 
 
 def redact_profanity(text: str) -> str:
-    return _regex.sub(lambda m: m.group(0)[0] + "***", text)
+    # The first-letter shortcut only holds for ASCII: case folding lets e.g. "ſ" start "shit"
+    ascii_text = text.isascii()
+    if ascii_text and _first_chars.isdisjoint(text):
+        return text
+    if _automaton is None:
+        return _regex.sub(_star, text)
+    if not ascii_text:
+        # str.lower() misses Unicode case variants that re.IGNORECASE folds
+        # (e.g. "ſ" for "s"), so only plain ASCII goes through the automaton
+        return _regex.sub(_star, text)
+    lowered = text.lower()
+    out = []
+    last = 0
+    for end, n in _automaton.iter(lowered):
+        start = end - n + 1
+        if start < last:
+            continue
+        out.append(text[last:start])
+        out.append(text[start] + "***")
+        last = end + 1
+    if not out:
+        return text
+    out.append(text[last:])
+    return "".join(out)
+
 
+# bucket_key -> (count, window_start_ts)
+_buckets: Dict[str, Tuple[int, float]] = {}
+_buckets_max = 10000
 
-_buckets: Dict[str, Dict[str, float]] = {}
 
+def _new_bucket(bucket_key: str, now: float, window: float) -> None:
+    # Keep dict order == window start order so expired buckets sit at the front
+    _buckets.pop(bucket_key, None)
+    while _buckets:
+        k0 = next(iter(_buckets))
+        if len(_buckets) >= _buckets_max or now - _buckets[k0][1] > window:
+            del _buckets[k0]
+        else:
+            break
+    _buckets[bucket_key] = (1, now)
 
-def rate_limit(request: Request, key: str, max_per_minute: int) -> None:
+
+async def rate_limit(request: Request, key: str, max_per_minute: int) -> None:
     ip = request.client.host if request.client else "unknown"
-    now = time.time()
     bucket_key = f"{ip}:{key}"
+    # Shared across workers when REDIS_URL is set; in-process buckets otherwise
+    count = await shared_cache.incr_window(f"rl:{bucket_key}", 60)
+    if count is not None:
+        if count > max_per_minute:
+            raise HTTPException(status_code=429, detail="Rate limit exceeded")
+        return
+    now = time.time()
     window = 60.0
     bucket = _buckets.get(bucket_key)
-    if not bucket:
-        _buckets[bucket_key] = {"count": 1, "ts": now}
-        return
-    if now - bucket["ts"] > window:
-        _buckets[bucket_key] = {"count": 1, "ts": now}
+    if bucket is None or now - bucket[1] > window:
+        _new_bucket(bucket_key, now, window)
         return
-    if bucket["count"] >= max_per_minute:
+    count, ts = bucket
+    if count >= max_per_minute:
         raise HTTPException(status_code=429, detail="Rate limit exceeded")
-    bucket["count"] += 1
-
-
+    # plain re-assignment keeps the key's position in the dict
+    _buckets[bucket_key] = (count + 1, ts)
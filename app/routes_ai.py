@@ -1,13 +1,22 @@
 import os
-import json
+import asyncio
+import functools
+import hashlib
+import heapq
 import time
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 import re
+from collections import OrderedDict
 
-import httpx
+import orjson
 from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
 
+from .db import get_pool
+from .routes_feeds import get_311_geojson
+from .routes_pins import query_pins
+from .routes_refdata import get_food_sites, get_shelters
+
 import sys
 try:
     import google.generativeai as genai
@@ -43,16 +52,45 @@ class QAReq(BaseModel):
     radius_mi: Optional[float] = 5.0
 
 
-_cache: Dict[str, Any] = {}
+# LRU (most recently used at the end) with a per-entry TTL checked on read
+_cache: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
 _ttl = int(os.getenv("ASSIST_CACHE_TTL", "900"))  # seconds
+_cache_max = int(os.getenv("ASSIST_CACHE_MAX", "2048"))  # entries
 _rl: Dict[str, float] = {}
 _rl_window = 8.0  # seconds between requests per client
+_rl_max = 10000  # tracked clients
 _llm_cooldown_until: float = 0.0
 _llm_cooldown_sec = float(os.getenv("ASSIST_LLM_COOLDOWN_SEC", "1800"))
 _disable_llm = (os.getenv("ASSIST_DISABLE_LLM", "false").lower() in ("1","true","yes"))
 
 _MODEL = (os.getenv("GEMINI_MODEL") or "gemini-1.5-flash").strip()
 
+# Local classifier patterns (compiled once, not per request)
+_WS_RE = re.compile(r"\s+")
+# radius parsing: "within 2 miles/mi"
+_RADIUS_RE = re.compile(r"within\s+(\d+(?:\.\d+)?)\s*(?:miles|mi)", re.IGNORECASE)
+# time window: "last 2 hours", "past 24h"
+_TIME_RE = re.compile(r"(?:last|past)\s+(\d+)\s*(minutes|min|hours|hrs|days|d)\b", re.IGNORECASE)
+# categories mapping
+_CAT_MAP = {
+    "meals": "Meals", "food": "Food", "pantry": "Food", "beds": "Beds", "shelter": "Shelter",
+    "medical": "Medical", "medicine": "Medical", "transport": "Transport", "ride": "Transport",
+    "supplies": "Supplies", "water": "Supplies"
+}
+# Lookaheads test every offset, so overlapping keywords are all seen in one pass
+_CAT_RE = re.compile("(?=(" + "|".join(re.escape(k) for k in _CAT_MAP) + "))")
+# Intent keywords; groups are listed in priority order (first match wins)
+_INTENT_RE = re.compile(
+    r"(?=(?P<feed311>311|service request|non-emergency)"
+    r"|(?P<shelters>shelter)"
+    r"|(?P<food>food|pantry|meal)"
+    r"|(?P<flood>flood|fema|dfirm)"
+    r"|(?P<offer>offer)"
+    r"|(?P<need>need)"
+    r"|(?P<pins>pin))"
+)
+_INTENT_PRIORITY = ("feed311", "shelters", "food", "flood", "offer", "need", "pins")
+
 
 def _resp_to_json(resp) -> Dict[str, Any]:
     """Best-effort conversion of Gemini response to JSON dict."""
@@ -61,7 +99,7 @@ def _resp_to_json(resp) -> Dict[str, Any]:
         txt = getattr(resp, "text", None)
         if isinstance(txt, str) and txt.strip():
             try:
-                return json.loads(txt)
+                return orjson.loads(txt)
             except Exception:
                 # Not JSON; wrap as answer
                 return {"answer": txt}
@@ -77,7 +115,7 @@ def _resp_to_json(resp) -> Dict[str, Any]:
             if parts and hasattr(parts[0], "text"):
                 raw = parts[0].text
                 try:
-                    return json.loads(raw)
+                    return orjson.loads(raw)
                 except Exception:
                     return {"answer": raw}
     except Exception:
@@ -93,22 +131,45 @@ def _cache_get(key: str):
     if time.time() - v[0] > _ttl:
         _cache.pop(key, None)
         return None
+    _cache.move_to_end(key)
     return v[1]
 
 
 def _cache_set(key: str, val: Any):
     _cache[key] = (time.time(), val)
+    _cache.move_to_end(key)
+    while len(_cache) > _cache_max:
+        _cache.popitem(last=False)
+
+
+def _rl_touch(k: str, now: float) -> None:
+    _rl.pop(k, None)
+    while _rl:
+        k0 = next(iter(_rl))
+        if len(_rl) >= _rl_max or now - _rl[k0] >= _rl_window:
+            del _rl[k0]
+        else:
+            break
+    _rl[k] = now
 
 
 def _sha(s: str) -> str:
-    import hashlib
-    return hashlib.sha1(s.encode("utf-8")).hexdigest()
+    # in-memory cache key only; a fast 128-bit digest is plenty
+    return hashlib.blake2b(s.encode("utf-8"), digest_size=16).hexdigest()
+
+
+# GenerativeModel instances are built once (schema parsed once) and reused
+_CLF_MODEL = None
+_ANS_MODEL = None
 
 
 def _classifier_model():
+    global _CLF_MODEL
     if not genai:
         raise HTTPException(500, "LLM not configured")
-    return genai.GenerativeModel(
+    if _CLF_MODEL is not None:
+        return _CLF_MODEL
+    _CLF_MODEL = genai.GenerativeModel(
         _MODEL,
         generation_config={
             "temperature": 0.1,
@@ -135,12 +196,16 @@ def _classifier_model():
             },
         },
     )
+    return _CLF_MODEL
 
 
 def _answerer_model():
+    global _ANS_MODEL
     if not genai:
         raise HTTPException(500, "LLM not configured")
-    return genai.GenerativeModel(
+    if _ANS_MODEL is not None:
+        return _ANS_MODEL
+    _ANS_MODEL = genai.GenerativeModel(
         _MODEL,
         generation_config={
             "temperature": 0.1,
@@ -149,32 +214,44 @@ def _answerer_model():
             "response_mime_type": "text/plain",
         },
     )
+    return _ANS_MODEL
+
+
+async def _fetch_pins() -> List[Dict[str, Any]]:
+    async with get_pool().connection() as conn:
+        return await query_pins(conn, ["need", "offer"])
 
 
 async def _fetch_basic_context() -> Dict[str, Any]:
-    # Prefer explicit SELF_BASE_URL; otherwise use container's PORT to talk to self
-    base = (os.getenv("SELF_BASE_URL") or f"http://127.0.0.1:{os.getenv('PORT', '8000')}")
-    async with httpx.AsyncClient(base_url=base, timeout=10) as c:
-        r1 = await c.get("/api/pins")
-        r2 = await c.get("/api/shelters")
-        r3 = await c.get("/api/food")
-        r4 = await c.get("/api/311")
-    return {"pins": r1.json(), "shelters": r2.json(), "food": r3.json(), "feed311": r4.json()}
+    # Call the route handlers in-process (no loopback HTTP or JSON round trip);
+    # the sources are independent, so overlap them.
+    pins, shelters, food, feed311 = await asyncio.gather(
+        _fetch_pins(), get_shelters(), get_food_sites(), get_311_geojson()
+    )
+    return {"pins": pins, "shelters": shelters, "food": food, "feed311": feed311}
 
 
 def _clip_by_radius(items: List[Dict[str, Any]], center: Optional[List[float]], radius_mi: Optional[float], lat_key="lat", lng_key="lng") -> List[Dict[str, Any]]:
     if not center or not radius_mi:
         return items
-    from math import radians, sin, cos, atan2, sqrt
+    from math import radians, sin, cos
     R = 3958.8
     clat, clng = center
-    def dist(a, b):
-        dphi = radians(a - clat)
-        dl = radians(b - clng)
-        p1, p2 = radians(clat), radians(a)
-        x = sin(dphi/2)**2 + cos(p1) * cos(p2) * sin(dl/2)**2
-        return 2 * R * atan2(sqrt(x), sqrt(1-x))
-    return [it for it in items if dist(it.get(lat_key), it.get(lng_key)) <= radius_mi]
+    # Center terms are loop-invariant; compare on the haversine "a" term so the
+    # per-item work is one cos and two sin calls (d <= r  <=>  a <= sin²(r/2R)).
+    phi1 = radians(clat)
+    lam1 = radians(clng)
+    cphi1 = cos(phi1)
+    half = min(radius_mi / (2 * R), 1.5707963267948966)
+    a_max = sin(half) ** 2
+    out = []
+    for it in items:
+        phi2 = radians(it.get(lat_key))
+        sdphi = sin((phi2 - phi1) / 2)
+        sdl = sin((radians(it.get(lng_key)) - lam1) / 2)
+        if sdphi * sdphi + cphi1 * cos(phi2) * sdl * sdl <= a_max:
+            out.append(it)
+    return out
 
 
 def _reduce_context(
@@ -244,6 +321,45 @@ def _reduce_context(
     return out
 
 
+@functools.lru_cache(maxsize=4096)
+def _classify_text(text: str) -> Tuple[str, Optional[str], Tuple[str, ...], Optional[float], Optional[int]]:
+    """Keyword classification of a normalized question.
+
+    Depends only on the text, so results are memoized; returns
+    (intent, kind, categories, radius_mi or None, time_window_hours or None).
+    """
+    rmatch = _RADIUS_RE.search(text)
+    radius = float(rmatch.group(1)) if rmatch else None
+    tmatch = _TIME_RE.search(text)
+    twh = None
+    if tmatch:
+        n = int(tmatch.group(1))
+        unit = tmatch.group(2)
+        if unit.startswith("min"):
+            twh = max(1, round(n / 60))
+        elif unit.startswith("hour") or unit.startswith("hr"):
+            twh = n
+        else:
+            twh = n * 24
+    found_cats = {m.group(1) for m in _CAT_RE.finditer(text)}
+    cats = []
+    for key, val in _CAT_MAP.items():
+        if key in found_cats and val not in cats:
+            cats.append(val)
+    # intent
+    intent = "summary"
+    kind = None
+    hits = {m.lastgroup for m in _INTENT_RE.finditer(text)}
+    for group in _INTENT_PRIORITY:
+        if group in hits:
+            if group in ("offer", "need"):
+                intent, kind = "pins", group
+            else:
+                intent = group
+            break
+    return intent, kind, tuple(cats), radius, twh
+
+
 @router.post("/qna")
 async def qna(req: QAReq, request: Request):
     # simple per-client rate limit
@@ -253,7 +369,7 @@ async def qna(req: QAReq, request: Request):
         last = _rl.get(k, 0)
         if now - last < _rl_window:
             return await _fallback(f"client rate-limited {int(_rl_window - (now - last))}s")
-        _rl[k] = now
+        _rl_touch(k, now)
     except Exception:
         pass
     async def _fallback(reason: str = "") -> Dict[str, Any]:
@@ -283,75 +399,35 @@ async def qna(req: QAReq, request: Request):
             return round(float(x), n)
         except Exception:
             return None
-    qnorm = re.sub(r"\s+", " ", (req.question or "").strip().lower())
+    qnorm = _WS_RE.sub(" ", (req.question or "").strip().lower())
     c_round = [
         _round_or_none((req.center or [None, None])[0], 2),
         _round_or_none((req.center or [None, None])[1], 2),
     ] if req.center else None
     r_round = _round_or_none(req.radius_mi or 5, 1)
-    key = _sha(json.dumps({"q": qnorm, "c": c_round, "r": r_round}))
+    # Fixed-format fields first and free text last keeps the key unambiguous
+    key = _sha(f"a|{c_round}|{r_round}|{qnorm}")
     cached = _cache_get(key)
     if cached:
         return cached
 
     # Step 1: classify (LLM if available; otherwise local heuristic)
-    def _local_classify(q: str) -> Dict[str, Any]:
-        text = (q or "").lower().strip()
-        # radius parsing: "within 2 miles/mi"
-        rmatch = re.search(r"within\s+(\d+(?:\.\d+)?)\s*(?:miles|mi)", text)
-        radius = float(rmatch.group(1)) if rmatch else (req.radius_mi or 5)
-        # time window: "last 2 hours", "past 24h"
-        tmatch = re.search(r"(?:last|past)\s+(\d+)\s*(minutes|min|hours|hrs|days|d)\b", text)
-        twh = None
-        if tmatch:
-            n = int(tmatch.group(1))
-            unit = tmatch.group(2)
-            if unit.startswith("min"):
-                twh = max(1, round(n / 60))
-            elif unit.startswith("hour") or unit.startswith("hr"):
-                twh = n
-            else:
-                twh = n * 24
-        # categories mapping
-        cat_map = {
-            "meals": "Meals", "food": "Food", "pantry": "Food", "beds": "Beds", "shelter": "Shelter",
-            "medical": "Medical", "medicine": "Medical", "transport": "Transport", "ride": "Transport",
-            "supplies": "Supplies", "water": "Supplies"
-        }
-        cats = []
-        for key, val in cat_map.items():
-            if key in text and val not in cats:
-                cats.append(val)
-        # intent
-        intent = "summary"
-        kind = None
-        if any(k in text for k in ["311", "service request", "non-emergency"]):
-            intent = "feed311"
-        elif any(k in text for k in ["shelter", "shelters"]):
-            intent = "shelters"
-        elif any(k in text for k in ["food", "pantry", "meal", "meals"]):
-            intent = "food"
-        elif any(k in text for k in ["flood", "floodplain", "fema", "dfirm"]):
-            intent = "flood"
-        elif any(k in text for k in ["offer", "offering help", "who is offering", "who offers"]):
-            intent = "pins"; kind = "offer"
-        elif any(k in text for k in ["need", "needs help", "who needs"]):
-            intent = "pins"; kind = "need"
-        elif "pin" in text:
-            intent = "pins"
+    def _local_classify() -> Dict[str, Any]:
+        intent, kind, cats, parsed_radius, twh = _classify_text(qnorm)
+        radius = parsed_radius if parsed_radius is not None else (req.radius_mi or 5)
         needs_clar = intent == "summary"
         follow = "What would you like to know: shelters, food, flood zones, 311, or community pins?" if needs_clar else ""
         filters = {"center": req.center, "radius_mi": radius}
         if kind:
             filters["kind"] = kind
         if cats:
-            filters["categories"] = cats
+            filters["categories"] = list(cats)
         if twh:
             filters["time_window_hours"] = twh
         return {"intent": intent, "needs_clarification": needs_clar, "followup_question": follow, "filters": filters}
 
     # Try classifier cache first (based on normalized inputs)
-    clf_cache_key = _sha(json.dumps({"clf": True, "q": qnorm, "c": c_round, "r": r_round}))
+    clf_cache_key = _sha(f"c|{c_round}|{r_round}|{qnorm}")
     clf_out = _cache_get(clf_cache_key)
     if llm_ok and not clf_out:
         try:
@@ -378,9 +454,9 @@ async def qna(req: QAReq, request: Request):
             if "429" in msg or "quota" in msg.lower():
                 globals()["_llm_cooldown_until"] = time.time() + _llm_cooldown_sec
             print("[assist] classifier error, falling back to local:", e)
-            clf_out = _local_classify(req.question)
+            clf_out = _local_classify()
     elif not clf_out:
-        clf_out = _local_classify(req.question)
+        clf_out = _local_classify()
 
     if clf_out.get("needs_clarification"):
         res = {"ask": clf_out.get("followup_question") or "What resource are you asking about?"}
@@ -404,25 +480,23 @@ async def qna(req: QAReq, request: Request):
     context = _reduce_context(data, intent, center, radius, filter_kind, filter_categories, time_window_hours)
 
     # Deterministic answers for known intents to avoid bland/fallback results
-    def haversine_mi(a,b,c,d):
-        from math import radians, sin, cos, atan2, sqrt
-        R=3958.8
-        p1=radians(a); p2=radians(c)
-        dphi=radians(c-a); dl=radians(d-b)
-        x=sin(dphi/2)**2+cos(p1)*cos(p2)*sin(dl/2)**2
-        return 2*R*atan2(sqrt(x),sqrt(1-x))
-
     def nearest(items, maxn=3, lat_key="lat", lng_key="lng"):
         if not (center and isinstance(center, list) and len(center)==2):
             return items[:maxn]
+        from math import radians, sin, cos, atan2, sqrt
+        R=3958.8
         lat0,lng0=center
+        p1=radians(lat0); l1=radians(lng0); cp1=cos(p1)
         for it in items:
             try:
-                it["_d"] = round(haversine_mi(lat0,lng0,float(it.get(lat_key)),float(it.get(lng_key))),2)
+                p2=radians(float(it.get(lat_key)))
+                sdphi=sin((p2-p1)/2); sdl=sin((radians(float(it.get(lng_key)))-l1)/2)
+                x=sdphi*sdphi+cp1*cos(p2)*sdl*sdl
+                it["_d"] = round(2*R*atan2(sqrt(x),sqrt(1-x)),2)
             except Exception:
                 it["_d"] = None
-        items.sort(key=lambda x: (x.get("_d") is None, x.get("_d") or 1e9))
-        return items[:maxn]
+        # top-k selection; same order as sorted(...)[:maxn] without a full sort
+        return heapq.nsmallest(maxn, items, key=lambda x: (x.get("_d") is None, x.get("_d") or 1e9))
 
     def compose(context: Dict[str,Any]) -> Dict[str, Any]:
         it = context.get("intent")
@@ -519,7 +593,6 @@ async def status() -> Dict[str, Any]:
     return {
         "has_key": has_key,
         "sdk_loaded": sdk_loaded,
-        "self_base_url": os.getenv("SELF_BASE_URL", "http://127.0.0.1:8000"),
         "python": sys.executable,
         "module_found": mod_found,
     }
@@ -1,11 +1,19 @@
+import asyncio
+import math
 import os
 import time
 from pathlib import Path
-from typing import Any, Dict
+from urllib.parse import urlsplit
+from typing import Any, Dict, Optional, Tuple
 
-import httpx
+import orjson
 from fastapi import APIRouter, HTTPException, Query, Request
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import Response, StreamingResponse
+from starlette.background import BackgroundTask
+
+from . import shared_cache
+from .http_cache import etag_for, json_response
+from .upstream import get_client
 
 
 router = APIRouter(prefix="/api", tags=["feeds"])
@@ -14,18 +22,28 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 DATA_DIR = BASE_DIR / "data"
 FALLBACK_311 = DATA_DIR / "houston_311_seed.geojson"
 
-_cache: Dict[str, Any] = {"data": None, "ts": 0}
+_cache: Dict[str, Any] = {"data": None, "body": None, "etag": None, "ts": 0}
 _ttl = 120  # seconds
+_max_311 = 100  # features kept from the 311 feed
+_311_headroom = 5  # upstream rows requested per kept feature (some lack coordinates)
+_max_overlay = 2000  # features requested per overlay query
+_swr = 300  # seconds a stale 311 body may be served while refreshing
+_refreshing: Optional["asyncio.Task[None]"] = None
+_refresh_lock = asyncio.Lock()
+# Overlay fetches in flight, keyed like their Redis entries
+_overlay_inflight: Dict[str, "asyncio.Task[Tuple[bytes, str]]"] = {}
 
 
 def _now() -> int:
     return int(time.time())
 
 
-def _arcgis_table_to_geojson(data: Dict[str, Any]) -> Dict[str, Any]:
+def _arcgis_table_to_geojson(data: Dict[str, Any], limit: int | None = None) -> Dict[str, Any]:
     # Convert ArcGIS FeatureSet (table, no geometry) to GeoJSON using Latitude/Longitude or Y/X
     features = []
     for f in (data.get("features") or []):
+        if limit is not None and len(features) >= limit:
+            break
         attrs = f.get("attributes") or {}
         lat = attrs.get("Latitude") or attrs.get("Y")
         lng = attrs.get("Longitude") or attrs.get("X")
@@ -44,33 +62,101 @@ def _arcgis_table_to_geojson(data: Dict[str, Any]) -> Dict[str, Any]:
     return {"type": "FeatureCollection", "features": features}
 
 
-@router.get("/311")
-async def houston_311():
+def _311_params(url: str) -> Optional[Dict[str, int]]:
+    """Upstream row cap, only for ArcGIS /query endpoints.
+
+    Other sources (presigned or CDN-hosted JSON) get the URL untouched. Records
+    without coordinates are dropped after the fetch, so ask for headroom and let
+    _arcgis_table_to_geojson(limit=_max_311) make the real cut.
+    """
+    parts = urlsplit(url)
+    if "/arcgis/rest/services/" not in parts.path or not parts.path.rstrip("/").endswith("/query"):
+        return None
+    if "resultrecordcount=" in parts.query.lower():
+        return None
+    return {"resultRecordCount": _max_311 * _311_headroom}
+
+
+async def _refresh_311() -> Tuple[Dict[str, Any], bytes, str]:
+    """Pull the 311 feed (from Redis if another worker just did) into _cache."""
     # Replace with actual endpoint if available; use generic placeholder
     url = os.getenv("HOUSTON_311_URL")
-    if _cache["data"] and _now() - _cache["ts"] < _ttl:
-        return JSONResponse(_cache["data"]) 
+    # Another worker may have refreshed it already (Redis entries expire at _ttl)
+    shared = await shared_cache.get_entry("feeds:311")
+    if shared:
+        ts, etag, body = shared
+        data = orjson.loads(body)
+        _cache["data"], _cache["body"], _cache["etag"], _cache["ts"] = data, body, etag, ts
+        return data, body, etag
+    resp = await get_client().get(url, params=_311_params(url), timeout=10)
+    resp.raise_for_status()
+    data = orjson.loads(resp.content)
+    # If ArcGIS table/json, convert to GeoJSON
+    if isinstance(data, dict) and data.get("type") != "FeatureCollection" and "features" in data:
+        data = _arcgis_table_to_geojson(data, limit=_max_311)
+    # Cap features count for performance
+    if isinstance(data, dict) and "features" in data:
+        data["features"] = data["features"][:_max_311]
+    body = orjson.dumps(data)
+    etag = etag_for(body)
+    _cache["data"], _cache["body"], _cache["etag"], _cache["ts"] = data, body, etag, _now()
+    await shared_cache.set_entry("feeds:311", body, etag, _ttl, ts=_cache["ts"])
+    return data, body, etag
+
+
+async def _refresh_311_once() -> Tuple[Dict[str, Any], bytes, str]:
+    # Single-flight: callers queue on the lock and reuse whatever the first one fetched
+    async with _refresh_lock:
+        if _cache["data"] and _now() - _cache["ts"] < _ttl:
+            return _cache["data"], _cache["body"], _cache["etag"]
+        return await _refresh_311()
+
+
+async def _revalidate_311() -> None:
+    global _refreshing
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            resp = await client.get(url)
-            resp.raise_for_status()
-            data = resp.json()
-            # If ArcGIS table/json, convert to GeoJSON
-            if isinstance(data, dict) and data.get("type") != "FeatureCollection" and "features" in data:
-                data = _arcgis_table_to_geojson(data)
-            # Cap features count for performance
-            if isinstance(data, dict) and "features" in data:
-                data["features"] = data["features"][:100]
-            _cache["data"], _cache["ts"] = data, _now()
-            return JSONResponse(data)
+        await _refresh_311_once()
+    except Exception as exc:
+        print("[311] background refresh failed:", exc)
+    finally:
+        _refreshing = None
+
+
+async def _load_311() -> Tuple[Dict[str, Any], bytes, str]:
+    """(geojson, serialized body, etag); upstream cached for _ttl, else seed file."""
+    global _refreshing
+    age = _now() - _cache["ts"]
+    if _cache["data"] and age < _ttl:
+        return _cache["data"], _cache["body"], _cache["etag"]
+    if _cache["data"] and age < _ttl + _swr:
+        # Serve stale now; one background task refreshes for the next caller
+        if _refreshing is None:
+            _refreshing = asyncio.create_task(_revalidate_311())
+        return _cache["data"], _cache["body"], _cache["etag"]
+    try:
+        return await _refresh_311_once()
     except Exception:
         if FALLBACK_311.exists():
-            import json as _json
-            data = _json.loads(FALLBACK_311.read_text(encoding="utf-8"))
-            return JSONResponse(content=data)
+            body = FALLBACK_311.read_bytes()
+            return orjson.loads(body), body, etag_for(body)
         raise HTTPException(status_code=502, detail="311 feed unavailable")
 
 
+async def get_311_geojson() -> Dict[str, Any]:
+    """Cached 311 GeoJSON (upstream, else bundled seed file)."""
+    return (await _load_311())[0]
+
+
+@router.get("/311")
+async def houston_311(request: Request):
+    _, body, etag = await _load_311()
+    return json_response(request, body, etag, _ttl, swr=_swr)
+
+
+_WMS_CACHE = "public, max-age=86400"
+_WMS_PASS_HEADERS = ("etag", "last-modified", "content-length", "content-encoding")
+
+
 @router.get("/flood/wms")
 async def flood_wms_proxy(request: Request):
     """
@@ -82,13 +168,34 @@ async def flood_wms_proxy(request: Request):
         raise HTTPException(status_code=400, detail="FLOOD_WMS_URL not configured")
     qs = str(request.url.query)
     upstream = f"{base}?{qs}" if qs else base
+    client = get_client()
+    fwd = {}
+    inm = request.headers.get("if-none-match")
+    if inm:
+        fwd["If-None-Match"] = inm
     try:
-        async with httpx.AsyncClient(timeout=20) as client:
-            resp = await client.get(upstream)
-            media = resp.headers.get("content-type", "image/png")
-            return StreamingResponse(resp.aiter_bytes(), media_type=media, status_code=resp.status_code)
+        req = client.build_request("GET", upstream, headers=fwd, timeout=20)
+        resp = await client.send(req, stream=True)
     except Exception as exc:
         raise HTTPException(status_code=502, detail=f"WMS proxy error: {exc}")
+    # Only tiles get the long default; errors (e.g. a 503 ServiceException) must not be cached
+    default_cc = _WMS_CACHE if resp.status_code in (200, 304) else "no-store"
+    headers = {"Cache-Control": resp.headers.get("cache-control", default_cc)}
+    for name in _WMS_PASS_HEADERS:
+        if name in resp.headers:
+            headers[name] = resp.headers[name]
+    if resp.status_code == 304:
+        await resp.aclose()
+        return Response(status_code=304, headers=headers)
+    media = resp.headers.get("content-type", "image/png")
+    # Raw bytes keep any upstream content-encoding, which is forwarded above
+    return StreamingResponse(
+        resp.aiter_raw(65536),
+        media_type=media,
+        status_code=resp.status_code,
+        headers=headers,
+        background=BackgroundTask(resp.aclose),
+    )
 
 
 
@@ -100,6 +207,7 @@ async def _arcgis_query_geojson(url: str, bbox: str | None = None, geometry_sr:
         "outFields": "*",
         "returnGeometry": "true",
         "outSR": "4326",
+        "resultRecordCount": _max_overlay,
     }
     if bbox:
         # bbox = minLng,minLat,maxLng,maxLat in WGS84
@@ -109,32 +217,77 @@ async def _arcgis_query_geojson(url: str, bbox: str | None = None, geometry_sr:
             "inSR": geometry_sr,
             "spatialRel": "esriSpatialRelIntersects",
         })
-    async with httpx.AsyncClient(timeout=20) as client:
-        r = await client.get(url.rstrip("/") + "/query", params=params)
-        r.raise_for_status()
-        data = r.json()
-        # Cap features for safety
-        if isinstance(data, dict) and "features" in data:
-            data["features"] = data["features"][:2000]
-        return data
+    r = await get_client().get(url.rstrip("/") + "/query", params=params, timeout=20)
+    r.raise_for_status()
+    data = orjson.loads(r.content)
+    # Services without pagination support ignore resultRecordCount
+    if isinstance(data, dict) and "features" in data:
+        data["features"] = data["features"][:_max_overlay]
+    return data
+
+
+async def _fetch_overlay(key: str, url: str, bbox: str | None) -> Tuple[bytes, str]:
+    data = await _arcgis_query_geojson(url, bbox=bbox)
+    body = orjson.dumps(data)
+    etag = etag_for(body)
+    await shared_cache.set_entry(key, body, etag, _ttl)
+    return body, etag
+
+
+def _parse_bbox(bbox: str | None) -> str | None:
+    """Validate minLng,minLat,maxLng,maxLat and return it at 4 decimals (~11 m).
+
+    Mins round down and maxes round up, so the envelope only ever grows and
+    near-identical map views share one cache key.
+    """
+    if bbox is None:
+        return None
+    parts = bbox.split(",")
+    if len(parts) != 4:
+        raise HTTPException(status_code=400, detail="bbox must be minLng,minLat,maxLng,maxLat")
+    try:
+        min_lng, min_lat, max_lng, max_lat = (float(p) for p in parts)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox values must be numbers")
+    if not (-180 <= min_lng <= max_lng <= 180 and -90 <= min_lat <= max_lat <= 90):
+        raise HTTPException(status_code=400, detail="bbox out of range")
+    lo, hi = math.floor, math.ceil
+    return ",".join(f"{r(v * 1e4) / 1e4:.4f}" for r, v in ((lo, min_lng), (lo, min_lat), (hi, max_lng), (hi, max_lat)))
+
+
+async def _overlay_response(request: Request, name: str, url: str, bbox: str | None) -> Response:
+    # Shared across workers when REDIS_URL is set; otherwise fetched per request
+    key = f"feeds:overlay:{name}:{bbox or '*'}"
+    shared = await shared_cache.get_entry(key)
+    if shared:
+        _, etag, body = shared
+    else:
+        # Concurrent requests for the same overlay/bbox share one upstream fetch
+        task = _overlay_inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(_fetch_overlay(key, url, bbox))
+            _overlay_inflight[key] = task
+            task.add_done_callback(lambda _t: _overlay_inflight.pop(key, None))
+        body, etag = await asyncio.shield(task)
+    return json_response(request, body, etag, _ttl, swr=_swr)
 
 
 @router.get("/overlay/metro_bus")
-async def overlay_metro_bus(bbox: str | None = Query(None, description="minLng,minLat,maxLng,maxLat")):
+async def overlay_metro_bus(request: Request, bbox: str | None = Query(None, description="minLng,minLat,maxLng,maxLat")):
     url = os.getenv("METRO_BUS_FEATURE_URL", "https://services.arcgis.com/NummVBqZSIJKUeVR/arcgis/rest/services/METRO_Frequent_Bus_Routes/FeatureServer/0")
+    bbox = _parse_bbox(bbox)
     try:
-        data = await _arcgis_query_geojson(url, bbox=bbox)
-        return JSONResponse(data)
+        return await _overlay_response(request, "metro_bus", url, bbox)
     except Exception as exc:
         raise HTTPException(status_code=502, detail=f"metro_bus overlay error: {exc}")
 
 
 @router.get("/overlay/food_deserts")
-async def overlay_food_deserts(bbox: str | None = Query(None, description="minLng,minLat,maxLng,maxLat")):
+async def overlay_food_deserts(request: Request, bbox: str | None = Query(None, description="minLng,minLat,maxLng,maxLat")):
     url = os.getenv("FOOD_DESERTS_FEATURE_URL", "https://services.arcgis.com/NummVBqZSIJKUeVR/arcgis/rest/services/Food_Deserts/FeatureServer/0")
+    bbox = _parse_bbox(bbox)
     try:
-        data = await _arcgis_query_geojson(url, bbox=bbox)
-        return JSONResponse(data)
+        return await _overlay_response(request, "food_deserts", url, bbox)
     except Exception as exc:
         raise HTTPException(status_code=502, detail=f"food_deserts overlay error: {exc}")
 
@@ -1,11 +1,14 @@
+import math
 from datetime import datetime, timedelta, timezone
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 import psycopg
+from psycopg.rows import class_row, dict_row
 from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import ORJSONResponse
 
 from .models import PinCreate, PinOut, CommentCreate, CommentOut
-from .db import get_db_url
+from .db import get_pool
 from .moderation import rate_limit, redact_profanity
 
 
@@ -13,27 +16,27 @@ router = APIRouter(prefix="/api", tags=["pins"])
 
 
 async def get_conn():
-    conn = await psycopg.AsyncConnection.connect(get_db_url())
-    try:
+    # Borrowed from the shared pool opened in init_db(); returned on exit
+    async with get_pool().connection() as conn:
         yield conn
-    finally:
-        await conn.close()
 
 
-@router.get("/pins", response_model=List[PinOut])
-async def list_pins(
-    kinds: Optional[str] = Query(None, description="Comma list: need,offer"),
-    categories: Optional[str] = None,
+async def query_pins(
+    conn: psycopg.AsyncConnection,
+    kind_list: List[str],
+    cat_list: Optional[List[str]] = None,
     since: Optional[datetime] = None,
-    center: Optional[str] = Query(None, description="lat,lng for distance calc"),
-    radius: Optional[float] = Query(None, description="miles; if provided with center, filter within"),
-    conn: psycopg.AsyncConnection = Depends(get_conn),
-):
-    kind_list = kinds.split(",") if kinds else ["need", "offer"]
-    cat_list = categories.split(",") if categories else None
-
+    center_lat: Optional[float] = None,
+    center_lng: Optional[float] = None,
+    radius: Optional[float] = None,
+) -> List[Dict[str, Any]]:
+    """Visible, unexpired pins as plain dicts in the PinOut shape (newest first, max 500)."""
+    # order by created_at desc limit 500 walks idx_pins_active_created (partial,
+    # is_hidden = false) and stops early, whatever the kind list;
+    # categories && uses idx_pins_categories_gin.
     base_sql = """
-        select id::text, kind, categories, title, body, lat, lng, urgency, author_anon_id, created_at, expires_at
+        select id::text as id, kind, categories, title, body, lat, lng, urgency, author_anon_id, created_at, expires_at,
+               null::float8 as distance_mi
         from pins
         where is_hidden = false
           and expires_at > now()
@@ -46,52 +49,74 @@ async def list_pins(
     if since:
         base_sql += " and created_at > %s"
         params.append(since)
+    if center_lat is not None and radius:
+        # Bounding-box prefilter (idx_pins_geo) so only nearby rows leave the DB;
+        # the exact great-circle check below trims the box corners.
+        ang = radius / 3958.8
+        dlat = math.degrees(ang)
+        base_sql += " and lat between %s and %s"
+        params.extend([center_lat - dlat, center_lat + dlat])
+        sin_ang, coslat = math.sin(ang), math.cos(math.radians(center_lat))
+        if ang < math.pi / 2 and sin_ang < coslat:
+            # widest longitude span of the circle (reached off the center's parallel)
+            dlng = math.degrees(math.asin(sin_ang / coslat))
+            base_sql += " and lng between %s and %s"
+            params.extend([center_lng - dlng, center_lng + dlng])
     base_sql += " order by created_at desc limit 500"
 
-    async with conn.cursor() as cur:
+    async with conn.cursor(row_factory=dict_row) as cur:
         await cur.execute(base_sql, params)
         rows = await cur.fetchall()
 
-    results: List[PinOut] = []
+    if center_lat is None or not radius:
+        return rows
+
+    # Radius filter (haversine, center terms hoisted)
+    R = 3958.8
+    radians, sin, cos, atan2, sqrt = math.radians, math.sin, math.cos, math.atan2, math.sqrt
+    phi1 = radians(center_lat)
+    lam1 = radians(center_lng)
+    cphi1 = cos(phi1)
+    results: List[Dict[str, Any]] = []
+    for r in rows:
+        phi2 = radians(r["lat"])
+        sdphi = sin((phi2 - phi1) / 2)
+        sdl = sin((radians(r["lng"]) - lam1) / 2)
+        a = sdphi * sdphi + cphi1 * cos(phi2) * sdl * sdl
+        d = 2 * R * atan2(sqrt(a), sqrt(1 - a))
+        if d <= radius:
+            r["distance_mi"] = round(d, 2)
+            results.append(r)
+    return results
+
+
+@router.get("/pins", response_model=List[PinOut])
+async def list_pins(
+    kinds: Optional[str] = Query(None, description="Comma list: need,offer"),
+    categories: Optional[str] = None,
+    since: Optional[datetime] = None,
+    center: Optional[str] = Query(None, description="lat,lng for distance calc"),
+    radius: Optional[float] = Query(None, description="miles; if provided with center, filter within"),
+    conn: psycopg.AsyncConnection = Depends(get_conn),
+) -> ORJSONResponse:
+    kind_list = kinds.split(",") if kinds else ["need", "offer"]
+    cat_list = categories.split(",") if categories else None
     center_lat, center_lng = (None, None)
     if center:
         try:
             center_lat, center_lng = [float(x) for x in center.split(",")]
         except Exception:
             pass
-    for r in rows:
-        item = PinOut(
-            id=r[0], kind=r[1], categories=r[2], title=r[3], body=r[4], lat=r[5], lng=r[6], urgency=r[7], author_anon_id=r[8], created_at=r[9], expires_at=r[10]
-        )
-        results.append(item)
-
-    # Optional radius filtering in app if center provided (simple Haversine-ish approximation)
-    if center and radius:
-        import math
-
-        def dist_mi(lat1, lon1, lat2, lon2):
-            R = 3958.8
-            phi1, phi2 = math.radians(lat1), math.radians(lat2)
-            dphi = math.radians(lat2 - lat1)
-            dlambda = math.radians(lon2 - lon1)
-            a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
-            return 2 * R * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-
-        filtered: List[PinOut] = []
-        for p in results:
-            d = dist_mi(center_lat, center_lng, p.lat, p.lng)
-            if d <= radius:
-                p.distance_mi = round(d, 2)
-                filtered.append(p)
-        results = filtered
-
-    return results
+    # Rows come straight from our own SELECT, so skip PinOut validation and
+    # let orjson encode the dicts directly.
+    rows = await query_pins(conn, kind_list, cat_list, since, center_lat, center_lng, radius)
+    return ORJSONResponse(rows)
 
 
 @router.post("/pins", response_model=PinOut)
 async def create_pin(payload: PinCreate, request: Request, conn: psycopg.AsyncConnection = Depends(get_conn)):
     # Rate limit create
-    rate_limit(request, key="create_pin", max_per_minute=3)
+    await rate_limit(request, key="create_pin", max_per_minute=3)
     # Redact profanity
     payload.body = redact_profanity(payload.body)
     expires = datetime.now(timezone.utc) + timedelta(hours=48)
@@ -100,16 +125,14 @@ async def create_pin(payload: PinCreate, request: Request, conn: psycopg.AsyncCo
         values (%s,%s,%s,%s,%s,%s,%s,%s,%s)
         returning id::text, kind, categories, title, body, lat, lng, urgency, author_anon_id, created_at, expires_at
     """
-    async with conn.cursor() as cur:
+    async with conn.cursor(row_factory=class_row(PinOut)) as cur:
         await cur.execute(
             sql,
             [payload.kind, payload.categories, payload.title, payload.body, payload.lat, payload.lng, payload.author_anon_id, payload.urgency, expires],
         )
         row = await cur.fetchone()
         await conn.commit()
-    return PinOut(
-        id=row[0], kind=row[1], categories=row[2], title=row[3], body=row[4], lat=row[5], lng=row[6], urgency=row[7], author_anon_id=row[8], created_at=row[9], expires_at=row[10]
-    )
+    return row
 
 
 @router.get("/pins/{pin_id}/comments", response_model=List[CommentOut])
@@ -121,16 +144,15 @@ async def list_comments(pin_id: str, conn: psycopg.AsyncConnection = Depends(get
         order by created_at asc
         limit 500
     """
-    async with conn.cursor() as cur:
+    async with conn.cursor(row_factory=class_row(CommentOut)) as cur:
         await cur.execute(sql, [pin_id])
-        rows = await cur.fetchall()
-    return [CommentOut(id=r[0], pin_id=r[1], body=r[2], created_at=r[3]) for r in rows]
+        return await cur.fetchall()
 
 
 @router.post("/pins/{pin_id}/comments", response_model=CommentOut)
 async def create_comment(pin_id: str, payload: CommentCreate, request: Request, conn: psycopg.AsyncConnection = Depends(get_conn)):
     # Rate limit comments
-    rate_limit(request, key="create_comment", max_per_minute=6)
+    await rate_limit(request, key="create_comment", max_per_minute=6)
     payload.body = redact_profanity(payload.body)
     # ensure pin exists and visible
     async with conn.cursor() as cur:
@@ -142,11 +164,11 @@ async def create_comment(pin_id: str, payload: CommentCreate, request: Request,
         values (%s,%s,%s)
         returning id::text, pin_id::text, body, created_at
     """
-    async with conn.cursor() as cur:
+    async with conn.cursor(row_factory=class_row(CommentOut)) as cur:
         await cur.execute(sql, [pin_id, payload.body, payload.author_anon_id])
         row = await cur.fetchone()
         await conn.commit()
-    return CommentOut(id=row[0], pin_id=row[1], body=row[2], created_at=row[3])
+    return row
 
 
 @router.post("/pins/{pin_id}/report")
@@ -1,12 +1,19 @@
-import json
 import os
+import asyncio
+import functools
 import time
 from pathlib import Path
 import csv
-from typing import List, Any, Dict
+from math import atan, pi, sinh
+from typing import List, Any, Dict, Iterator, Optional, Tuple
 
-import httpx
-from fastapi import APIRouter, HTTPException
+import orjson
+from fastapi import APIRouter, HTTPException, Request
+
+from . import config  # noqa: F401  # .env must be loaded before the URLs below are read
+from . import shared_cache
+from .http_cache import etag_for, gzip_body, json_response
+from .upstream import get_client
 
 
 router = APIRouter(prefix="/api", tags=["refdata"])
@@ -19,54 +26,183 @@ DOCS_DIR = BASE_DIR / "docs"
 PANTRIES_CSV = DOCS_DIR / "Hou_Pantries.csv"
 
 
+def _shelters_url() -> Optional[str]:
+    url = os.getenv("SHELTERS_URL")
+    # Support overriding via SHELTERS_LAYER (0/1/2) appended to FeatureServer URL
+    layer_idx = os.getenv("SHELTERS_LAYER")
+    if url and layer_idx and "/FeatureServer" in url and url.rstrip("/").endswith("FeatureServer"):
+        url = url.rstrip("/") + f"/{layer_idx}"
+    return url
+
+
+# Upstream sources are fixed per process: resolve them and their URL shape once
+_SHELTERS_URL = _shelters_url()
+_SHELTERS_IS_ARCGIS_LAYER = bool(
+    _SHELTERS_URL and "arcgis/rest/services" in _SHELTERS_URL and "FeatureServer" in _SHELTERS_URL and "/query" not in _SHELTERS_URL
+)
+_SHELTERS_IS_ARCGIS_QUERY = bool(_SHELTERS_URL and "FeatureServer" in _SHELTERS_URL and "/query" in _SHELTERS_URL)
+_FOOD_URL = os.getenv("FOOD_SITES_URL")
+
+
+@functools.lru_cache(maxsize=8)
+def _read_json_cached(path_str: str, mtime_ns: int, size: int) -> Any:
+    # Keyed like _read_pantries_cached; the parsed value is shared, don't mutate it
+    return orjson.loads(Path(path_str).read_bytes())
+
+
 def _read_json(path: Path):
-    if not path.exists():
+    try:
+        st = path.stat()
+    except OSError:
         raise HTTPException(status_code=404, detail=f"Missing data file: {path.name}")
-    return json.loads(path.read_text(encoding="utf-8"))
+    return _read_json_cached(str(path), st.st_mtime_ns, st.st_size)
+
+
+class _Cache:
+    """Standardized remote layers; *_ts are time.monotonic() stamps."""
+
+    __slots__ = ("shelters", "shelters_ts", "food", "food_ts")
+
+    def __init__(self) -> None:
+        self.shelters: Optional[List[Dict[str, Any]]] = None
+        self.shelters_ts = 0.0
+        self.food: Optional[List[Dict[str, Any]]] = None
+        self.food_ts = 0.0
+
+
+class _Merged:
+    """A merged response: list, serialized (and gzipped) body, etag and monotonic build time."""
+
+    __slots__ = ("data", "body", "gzip", "etag", "ts")
+
+    def __init__(self) -> None:
+        self.data: Optional[List[Dict[str, Any]]] = None
+        self.body: Optional[bytes] = None
+        self.gzip: Optional[bytes] = None
+        self.etag: Optional[str] = None
+        self.ts = 0.0
+
+    def set(self, data: List[Dict[str, Any]]) -> None:
+        self.data = data
+        self.body = orjson.dumps(data)
+        # Compressed once per refresh instead of per response
+        self.gzip = gzip_body(self.body)
+        self.etag = etag_for(self.body)
+        self.ts = time.monotonic()
+
+
+_cache = _Cache()
+# Merged responses, rebuilt by _refresh_loop
+_merged_shelters = _Merged()
+_merged_food = _Merged()
+_REFRESH_EVERY = 300
+_refresh_task: Optional["asyncio.Task[None]"] = None
+_shelters_lock = asyncio.Lock()
+_food_lock = asyncio.Lock()
+
+class _NotModified(Exception):
+    """Upstream answered 304: the cached layer is still current."""
+
+
+# Request URL -> conditional headers from its last 200 (ETag / Last-Modified)
+_validators: Dict[str, Dict[str, str]] = {}
+
+
+async def _get_json(url: str, params: Optional[Dict[str, str]] = None, timeout: float = 20) -> Any:
+    """GET + orjson decode, revalidating against the previous response when possible."""
+    key = url + ("?" + "&".join(f"{k}={v}" for k, v in sorted(params.items())) if params else "")
+    r = await get_client().get(url, params=params, headers=_validators.get(key), timeout=timeout)
+    if r.status_code == 304:
+        raise _NotModified(key)
+    r.raise_for_status()
+    cond = {}
+    if "etag" in r.headers:
+        cond["If-None-Match"] = r.headers["etag"]
+    if "last-modified" in r.headers:
+        cond["If-Modified-Since"] = r.headers["last-modified"]
+    if cond:
+        _validators[key] = cond
+    else:
+        _validators.pop(key, None)
+    return orjson.loads(r.content)
 
-_cache: Dict[str, Any] = {"s": None, "s_ts": 0, "f": None, "f_ts": 0}
 
 async def _fetch_json(url: str) -> Any:
-    async with httpx.AsyncClient(timeout=30) as client:
-        r = await client.get(url)
-        r.raise_for_status()
-        return r.json()
+    return await _get_json(url, timeout=30)
 
-def _arcgis_to_points(data: Dict[str, Any]) -> List[Dict[str, Any]]:
-    points: List[Dict[str, Any]] = []
-    sr = (data.get("spatialReference") or {}).get("wkid") or None
-    for feat in (data.get("features") or []):
+_R_EARTH = 6378137.0  # Web Mercator sphere radius (m)
+_RAD_TO_DEG = 180.0 / pi
+_M_TO_DEG = _RAD_TO_DEG / _R_EARTH
+_LAT_KEYS = ("Latitude", "Y")
+_LNG_KEYS = ("Longitude", "X")
+
+
+def _raw_coords(features: List[Dict[str, Any]]) -> Iterator[Tuple[Dict[str, Any], float, float]]:
+    """(attrs, lat, lng) as given by each ArcGIS feature, in whatever SR it uses."""
+    for feat in features:
         attrs = feat.get("attributes") or {}
         geom = feat.get("geometry") or {}
-        lat = attrs.get("Latitude") or attrs.get("Y") or geom.get("y")
-        lng = attrs.get("Longitude") or attrs.get("X") or geom.get("x")
+        lat = _first(attrs, _LAT_KEYS) or geom.get("y")
+        lng = _first(attrs, _LNG_KEYS) or geom.get("x")
         if lat is None or lng is None:
             continue
         try:
-            lat_f = float(lat)
-            lng_f = float(lng)
+            yield attrs, float(lat), float(lng)
         except Exception:
             continue
+
+
+def _from_mercator(y: float, x: float) -> Optional[Tuple[float, float]]:
+    # EPSG:3857 → EPSG:4326
+    try:
+        return _RAD_TO_DEG * atan(sinh(y / _R_EARTH)), x * _M_TO_DEG
+    except OverflowError:
+        return None
+
+
+def _arcgis_to_points(data: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """Yield {"lat","lng","attrs"} per usable feature of an ArcGIS f=json FeatureSet."""
+    sr = (data.get("spatialReference") or {}).get("wkid") or None
+    features = data.get("features") or []
+    # The spatial reference is per response, so pick the loop once
+    if sr in (102100, 3857):
+        for attrs, y, x in _raw_coords(features):
+            ll = _from_mercator(y, x)
+            if ll is not None:
+                yield {"lat": ll[0], "lng": ll[1], "attrs": attrs}
+        return
+    for attrs, lat_f, lng_f in _raw_coords(features):
         # Auto-convert Web Mercator (meters) to WGS84 if values out of lat/lng range
-        if abs(lat_f) > 90 or abs(lng_f) > 180 or (sr in (102100, 3857)):
-            try:
-                # EPSG:3857 → EPSG:4326
-                R = 6378137.0
-                x = lng_f
-                y = lat_f
-                lng_f = (x / R) * 180.0 / 3.141592653589793
-                lat_f = (2 * ( (y / R) ))
-                lat_f = (180.0 / 3.141592653589793) * (0.5 * (3.141592653589793 + ( (lambda t: (2*__import__('math').atan(__import__('math').exp(t)) - 3.141592653589793))(lat_f) )))
-            except Exception:
-                # Fallback: skip invalid point
+        if abs(lat_f) > 90 or abs(lng_f) > 180:
+            ll = _from_mercator(lat_f, lng_f)
+            if ll is None:
                 continue
-        points.append({"lat": lat_f, "lng": lng_f, "attrs": attrs})
-    return points
+            lat_f, lng_f = ll
+        yield {"lat": lat_f, "lng": lng_f, "attrs": attrs}
+
+
+def _geojson_points(feats: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """Yield {"lat","lng","attrs"} for the Point features of a GeoJSON feature list."""
+    for feat in feats:
+        try:
+            geom = feat.get("geometry") or {}
+            if geom.get("type") != "Point":
+                continue
+            coords = geom.get("coordinates") or []
+            if len(coords) >= 2:
+                yield {"lat": float(coords[1]), "lng": float(coords[0]), "attrs": feat.get("properties") or {}}
+        except Exception:
+            continue
+
+
+# Layer /query URL -> "geojson" | "json": which f= format the layer answered with
+_arcgis_format: Dict[str, str] = {}
 
 
 async def _arcgis_query_features(url: str) -> List[Dict[str, Any]]:
-    """Query an ArcGIS FeatureServer layer robustly and return list of features (dicts).
-    Tries f=geojson first; if not supported returns f=json and converts to GeoJSON-like dicts.
+    """Query an ArcGIS FeatureServer layer robustly and return {"lat","lng","attrs"} points.
+    Tries f=geojson first; if not supported falls back to f=json (polygons become centroids).
+    Points are built straight from each parsed feature, with no intermediate feature list.
     """
     params = {
         "where": "1=1",
@@ -75,126 +211,138 @@ async def _arcgis_query_features(url: str) -> List[Dict[str, Any]]:
         "outSR": "4326",
     }
     qurl = url.rstrip("/") + "/query"
-    # Try GeoJSON response
-    try:
-        async with httpx.AsyncClient(timeout=20) as client:
-            p = {**params, "f": "geojson"}
-            r = await client.get(qurl, params=p)
-            r.raise_for_status()
-            gj = r.json()
-            feats = gj.get("features") or []
+    # Try GeoJSON response, unless this layer is already known not to serve it
+    if _arcgis_format.get(qurl) != "json":
+        try:
+            gj = await _get_json(qurl, {**params, "f": "geojson"})
+        except _NotModified:
+            raise
+        except Exception:
+            # Transport error / 5xx: fall back for this call only
+            gj = None
+        if gj is not None:
+            feats = gj.get("features") if isinstance(gj, dict) else None
             if feats:
-                return feats
-    except Exception:
-        pass
+                _arcgis_format[qurl] = "geojson"
+                return list(_geojson_points(feats))
+            # Answered, but with no features or an ArcGIS error body
+            _arcgis_format[qurl] = "json"
     # Fallback to JSON and convert
-    async with httpx.AsyncClient(timeout=20) as client:
-        p = {**params, "f": "json"}
-        r = await client.get(qurl, params=p)
-        r.raise_for_status()
-        data = r.json()
-        feats = []
-        for f in (data.get("features") or []):
-            attrs = f.get("attributes") or {}
-            geom = f.get("geometry") or {}
-            lat = None
-            lng = None
-            # Point geometry
-            if "y" in geom and "x" in geom:
-                lat = geom.get("y")
-                lng = geom.get("x")
-            # Polygon centroid (simple average of ring vertices)
-            elif "rings" in geom:
-                try:
-                    xs = []
-                    ys = []
-                    for ring in geom.get("rings") or []:
-                        for pt in ring:
-                            xs.append(pt[0])
-                            ys.append(pt[1])
-                    if xs and ys:
-                        lng = sum(xs) / len(xs)
-                        lat = sum(ys) / len(ys)
-                except Exception:
-                    lat, lng = None, None
-            if lat is None or lng is None:
-                continue
-            feats.append({"geometry": {"type": "Point", "coordinates": [lng, lat]}, "properties": attrs})
-        return feats
+    data = await _get_json(qurl, {**params, "f": "json"})
+    points: List[Dict[str, Any]] = []
+    for f in (data.get("features") or []):
+        attrs = f.get("attributes") or {}
+        geom = f.get("geometry") or {}
+        lat = None
+        lng = None
+        # Point geometry
+        if "y" in geom and "x" in geom:
+            lat = geom.get("y")
+            lng = geom.get("x")
+        # Polygon centroid (simple average of ring vertices)
+        elif "rings" in geom:
+            try:
+                xs = []
+                ys = []
+                for ring in geom.get("rings") or []:
+                    for pt in ring:
+                        xs.append(pt[0])
+                        ys.append(pt[1])
+                if xs and ys:
+                    lng = sum(xs) / len(xs)
+                    lat = sum(ys) / len(ys)
+            except Exception:
+                lat, lng = None, None
+        if lat is None or lng is None:
+            continue
+        try:
+            points.append({"lat": float(lat), "lng": float(lng), "attrs": attrs})
+        except (TypeError, ValueError):
+            continue
+    return points
+
+_ID_KEYS = ("ObjectID", "id")
+_UPDATED_KEYS = ("Updated", "LastUpdate")
+_SHELTER_TYPE_KEYS = ("Type", "Source")
+_SHELTER_NAME_KEYS = ("Name", "FacilityName", "Title")
+_SHELTER_CAPACITY_KEYS = ("Capacity", "Beds")
+_SHELTER_NOTES_KEYS = ("Notes", "Status_1", "Status")
+_FOOD_KIND_KEYS = ("Kind", "Type", "Category")
+_FOOD_NAME_KEYS = ("Name", "SiteName", "Title")
+_FOOD_STATUS_KEYS = ("Status", "Open")
+_FOOD_NEEDS_KEYS = ("Needs", "Notes")
+_FOOD_KINDS = {"dropoff": "drop_off", "drop_off": "drop_off", "donation": "drop_off", "free_food": "free_food"}
+
+
+def _first(attrs: Dict[str, Any], keys: Tuple[str, ...], default: Any = None) -> Any:
+    # Same semantics as attrs.get(a) or attrs.get(b) or ... or default
+    for k in keys:
+        v = attrs.get(k)
+        if v:
+            return v
+    return default
+
 
 def _std_shelter(item: Dict[str, Any]) -> Dict[str, Any]:
     attrs = item.get("attrs", {})
-    t = attrs.get("Type") or attrs.get("Source") or "official"
-    if isinstance(t, str):
-        t = t.lower()
+    t = _first(attrs, _SHELTER_TYPE_KEYS, "official")
     return {
-        "id": attrs.get("ObjectID") or attrs.get("id") or None,
-        "name": attrs.get("Name") or attrs.get("FacilityName") or attrs.get("Title") or "Shelter",
-        "type": t if isinstance(t, str) else "community",
+        "id": _first(attrs, _ID_KEYS),
+        "name": _first(attrs, _SHELTER_NAME_KEYS, "Shelter"),
+        "type": t.lower() if isinstance(t, str) else "community",
         "lat": item["lat"],
         "lng": item["lng"],
-        "capacity": attrs.get("Capacity") or attrs.get("Beds") or None,
-        "notes": attrs.get("Notes") or attrs.get("Status_1") or attrs.get("Status") or None,
-        "last_updated": attrs.get("Updated") or attrs.get("LastUpdate") or None,
+        "capacity": _first(attrs, _SHELTER_CAPACITY_KEYS),
+        "notes": _first(attrs, _SHELTER_NOTES_KEYS),
+        "last_updated": _first(attrs, _UPDATED_KEYS),
     }
 
 def _std_food(item: Dict[str, Any]) -> Dict[str, Any]:
     attrs = item.get("attrs", {})
-    kind = (attrs.get("Kind") or attrs.get("Type") or attrs.get("Category") or "free_food").lower() if isinstance(attrs.get("Kind") or attrs.get("Type") or attrs.get("Category"), str) else "free_food"
-    if kind in ("dropoff", "drop_off", "donation"):
-        kind = "drop_off"
-    elif kind not in ("free_food", "drop_off"):
-        kind = "free_food"
+    raw_kind = _first(attrs, _FOOD_KIND_KEYS)
+    source = attrs.get("Source")
     return {
-        "id": attrs.get("ObjectID") or attrs.get("id") or None,
-        "name": attrs.get("Name") or attrs.get("SiteName") or attrs.get("Title") or "Food/Supply",
-        "kind": kind,
+        "id": _first(attrs, _ID_KEYS),
+        "name": _first(attrs, _FOOD_NAME_KEYS, "Food/Supply"),
+        "kind": _FOOD_KINDS.get(raw_kind.lower(), "free_food") if isinstance(raw_kind, str) else "free_food",
         "lat": item["lat"],
         "lng": item["lng"],
-        "status": attrs.get("Status") or attrs.get("Open") or None,
-        "needs": attrs.get("Needs") or attrs.get("Notes") or None,
-        "source": (attrs.get("Source") or "official").lower() if isinstance(attrs.get("Source"), str) else "official",
-        "last_updated": attrs.get("Updated") or attrs.get("LastUpdate") or None,
+        "status": _first(attrs, _FOOD_STATUS_KEYS),
+        "needs": _first(attrs, _FOOD_NEEDS_KEYS),
+        "source": (source or "official").lower() if isinstance(source, str) else "official",
+        "last_updated": _first(attrs, _UPDATED_KEYS),
     }
 
 
-def _read_pantries_csv() -> List[Dict[str, Any]]:
+# Hou_Pantries.csv has no header row: name, address, website, phone, lat, lng
+_P_NAME, _P_ADDRESS, _P_WEBSITE, _P_LAT, _P_LNG = 0, 1, 2, 4, 5
+
+
+@functools.lru_cache(maxsize=4)
+def _read_pantries_cached(path_str: str, mtime_ns: int, size: int) -> List[Dict[str, Any]]:
+    # mtime_ns/size only key the cache: an edited file gets a fresh entry.
+    # The returned list is shared; callers copy it (list.extend) rather than mutate.
     results: List[Dict[str, Any]] = []
-    if not PANTRIES_CSV.exists():
-        return results
     try:
-        with PANTRIES_CSV.open("r", encoding="utf-8") as f:
+        with open(path_str, "r", encoding="utf-8-sig") as f:
             reader = csv.reader(f)
             for row in reader:
-                if not row or len(row) < 3:
+                if len(row) <= _P_LNG:
                     continue
-                # Heuristic: last two numeric fields are lat,lng
-                lat = None
-                lng = None
-                for i in range(len(row) - 1, -1, -1):
-                    try:
-                        val = float(row[i])
-                        if lng is None:
-                            lng = val
-                        elif lat is None:
-                            lat = val
-                            break
-                    except Exception:
-                        continue
-                if lat is None or lng is None:
+                try:
+                    lat = float(row[_P_LAT])
+                    lng = float(row[_P_LNG])
+                except ValueError:
                     continue
-                name = row[0].strip()
-                address = row[1].strip() if len(row) > 1 else ""
-                website = row[2].strip() if len(row) > 2 else ""
                 results.append({
                     "id": None,
-                    "name": name,
+                    "name": row[_P_NAME].strip(),
                     "kind": "free_food",
-                    "lat": float(lat),
-                    "lng": float(lng),
+                    "lat": lat,
+                    "lng": lng,
                     "status": None,
-                    "needs": address,
-                    "website": website,
+                    "needs": row[_P_ADDRESS].strip(),
+                    "website": row[_P_WEBSITE].strip(),
                     "source": "official",
                     "last_updated": None,
                 })
@@ -203,110 +351,188 @@ def _read_pantries_csv() -> List[Dict[str, Any]]:
     return results
 
 
-@router.get("/shelters")
-async def list_shelters(nocache: bool = False):
-    remote_url = os.getenv("SHELTERS_URL")
-    results: List[Dict[str, Any]] = []
-    now = int(time.time())
-    if nocache:
-        _cache["s"], _cache["s_ts"] = None, 0
-    if remote_url:
-        # Support overriding via SHELTERS_LAYER (0/1/2) appended to FeatureServer URL
-        layer_idx = os.getenv("SHELTERS_LAYER")
-        if layer_idx and "/FeatureServer" in remote_url and remote_url.rstrip("/").endswith("FeatureServer"):
-            remote_url = remote_url.rstrip("/") + f"/{layer_idx}"
-        if not _cache["s"] or now - _cache["s_ts"] > 300:
+def _read_pantries_csv() -> List[Dict[str, Any]]:
+    try:
+        st = PANTRIES_CSV.stat()
+    except OSError:
+        return []
+    return _read_pantries_cached(str(PANTRIES_CSV), st.st_mtime_ns, st.st_size)
+
+
+async def _fetch_shelters_remote() -> List[Dict[str, Any]]:
+    remote_url = _SHELTERS_URL
+    # Prefer ArcGIS FeatureServer layer URLs (not direct /query URLs)
+    if _SHELTERS_IS_ARCGIS_LAYER:
+        return [_std_shelter(p) for p in await _arcgis_query_features(remote_url)]
+    # Accept direct ArcGIS /query URLs or plain JSON
+    points: List[Dict[str, Any]] = []
+    # If the URL is a layer /query URL, prefer robust layer query
+    if _SHELTERS_IS_ARCGIS_QUERY:
+        try:
+            points = await _arcgis_query_features(remote_url.split("/query")[0])
+        except _NotModified:
+            raise
+        except Exception:
+            pass
+    if points:
+        return [_std_shelter(p) for p in points]
+    data = await _fetch_json(remote_url)
+    # If the response is GeoJSON, convert accordingly
+    if isinstance(data, dict) and data.get("type") == "FeatureCollection" and isinstance(data.get("features"), list):
+        return [_std_shelter(p) for p in _geojson_points(data["features"])]
+    return [_std_shelter(p) for p in _arcgis_to_points(data)]
+
+
+def _shared_age_ts(wall_ts: float) -> float:
+    # Redis entries carry wall-clock stamps (shared across hosts); map to monotonic
+    return time.monotonic() - max(0.0, time.time() - wall_ts)
+
+
+async def _remote_shelters(nocache: bool) -> List[Dict[str, Any]]:
+    if not _cache.shelters or time.monotonic() - _cache.shelters_ts > 300:
+        shared = None if nocache else await shared_cache.get_entry("refdata:shelters")
+        if shared:
+            _cache.shelters, _cache.shelters_ts = orjson.loads(shared[2]), _shared_age_ts(shared[0])
+        else:
             try:
-                # Prefer ArcGIS FeatureServer layer URLs (not direct /query URLs)
-                is_arcgis_layer = ("arcgis/rest/services" in remote_url) and ("FeatureServer" in remote_url) and ("/query" not in remote_url)
-                if is_arcgis_layer:
-                    feats = await _arcgis_query_features(remote_url)
-                    pts: List[Dict[str, Any]] = []
-                    for feat in feats:
-                        try:
-                            geom = feat.get("geometry") or {}
-                            props = feat.get("properties") or {}
-                            if geom.get("type") == "Point":
-                                lng, lat = geom.get("coordinates") or [None, None]
-                                if lat is None or lng is None:
-                                    continue
-                                pts.append({"lat": float(lat), "lng": float(lng), "attrs": props})
-                        except Exception:
-                            continue
-                    _cache["s"] = [_std_shelter(p) for p in pts]
-                    _cache["s_ts"] = now
-                else:
-                    # Accept direct ArcGIS /query URLs or plain JSON
-                    points: List[Dict[str, Any]] = []
-                    # If the URL is a layer /query URL, prefer robust layer query
-                    if ("FeatureServer" in remote_url) and ("/query" in remote_url):
-                        try:
-                            layer_url = remote_url.split("/query")[0]
-                            feats = await _arcgis_query_features(layer_url)
-                            for feat in feats:
-                                try:
-                                    geom = feat.get("geometry") or {}
-                                    props = feat.get("properties") or {}
-                                    if geom.get("type") == "Point":
-                                        lng, lat = geom.get("coordinates") or [None, None]
-                                        if lat is None or lng is None:
-                                            continue
-                                        points.append({"lat": float(lat), "lng": float(lng), "attrs": props})
-                                except Exception:
-                                    continue
-                        except Exception:
-                            pass
-                    if not points:
-                        data = await _fetch_json(remote_url)
-                        # If the response is GeoJSON, convert accordingly
-                        if isinstance(data, dict) and data.get("type") == "FeatureCollection" and isinstance(data.get("features"), list):
-                            for feat in data.get("features") or []:
-                                try:
-                                    geom = feat.get("geometry") or {}
-                                    props = feat.get("properties") or {}
-                                    if geom.get("type") == "Point":
-                                        coords = geom.get("coordinates") or []
-                                        if len(coords) >= 2:
-                                            lng, lat = coords[0], coords[1]
-                                            points.append({"lat": float(lat), "lng": float(lng), "attrs": props})
-                                except Exception:
-                                    continue
-                        else:
-                            points = _arcgis_to_points(data)
-                    _cache["s"] = [_std_shelter(p) for p in points]
-                    _cache["s_ts"] = now
+                _cache.shelters = await _fetch_shelters_remote()
+                _cache.shelters_ts = time.monotonic()
+                await shared_cache.set_entry("refdata:shelters", orjson.dumps(_cache.shelters), "", 300)
+            except _NotModified:
+                _cache.shelters_ts = time.monotonic()
             except Exception:
-                _cache["s"] = []
-        results.extend(_cache["s"])  
-    try:
-        results.extend(_read_json(SHELTERS_FILE))
-    except HTTPException:
-        pass
-    return results
+                _cache.shelters = []
+                # Nothing cached to fall back on, so the next fetch must be unconditional
+                _validators.clear()
+    return _cache.shelters
 
 
-@router.get("/food")
-async def list_food_sites():
-    remote_url = os.getenv("FOOD_SITES_URL")
-    results: List[Dict[str, Any]] = []
-    now = int(time.time())
-    if remote_url:
-        if not _cache["f"] or now - _cache["f_ts"] > 300:
+async def _remote_food() -> List[Dict[str, Any]]:
+    if not _cache.food or time.monotonic() - _cache.food_ts > 300:
+        shared = await shared_cache.get_entry("refdata:food")
+        if shared:
+            _cache.food, _cache.food_ts = orjson.loads(shared[2]), _shared_age_ts(shared[0])
+        else:
             try:
-                data = await _fetch_json(remote_url)
-                points = _arcgis_to_points(data)
-                _cache["f"] = [_std_food(p) for p in points]
-                _cache["f_ts"] = now
+                data = await _fetch_json(_FOOD_URL)
+                _cache.food = [_std_food(p) for p in _arcgis_to_points(data)]
+                _cache.food_ts = time.monotonic()
+                await shared_cache.set_entry("refdata:food", orjson.dumps(_cache.food), "", 300)
+            except _NotModified:
+                _cache.food_ts = time.monotonic()
             except Exception:
-                _cache["f"] = []
-        results.extend(_cache["f"])  
-    # Local JSON
+                _cache.food = []
+                _validators.clear()
+    return _cache.food
+
+
+async def _none() -> List[Dict[str, Any]]:
+    return []
+
+
+def _extend(results: List[Dict[str, Any]], part: Any) -> None:
+    # Missing local files surface as HTTPException; anything else is a real error
+    if isinstance(part, HTTPException):
+        return
+    if isinstance(part, BaseException):
+        raise part
+    results.extend(part)
+
+
+async def _build_shelters(nocache: bool = False) -> None:
+    results: List[Dict[str, Any]] = []
+    if nocache:
+        _cache.shelters, _cache.shelters_ts = None, 0.0
+        _validators.clear()
+    # Remote refresh overlaps with the local file read
+    parts = await asyncio.gather(
+        _remote_shelters(nocache) if _SHELTERS_URL else _none(),
+        asyncio.to_thread(_read_json, SHELTERS_FILE),
+        return_exceptions=True,
+    )
+    for part in parts:
+        _extend(results, part)
+    _merged_shelters.set(results)
+
+
+async def _build_food() -> None:
+    results: List[Dict[str, Any]] = []
+    # Remote refresh, local JSON and CSV pantries run concurrently
+    parts = await asyncio.gather(
+        _remote_food() if _FOOD_URL else _none(),
+        asyncio.to_thread(_read_json, FOOD_FILE),
+        asyncio.to_thread(_read_pantries_csv),
+        return_exceptions=True,
+    )
+    for part in parts:
+        _extend(results, part)
+    _merged_food.set(results)
+
+
+def _stale(merged: _Merged) -> bool:
+    # The refresh loop keeps these warm; this only trips before its first pass
+    # or if it has stalled.
+    return merged.body is None or time.monotonic() - merged.ts > 2 * _REFRESH_EVERY
+
+
+async def _refresh(lock: asyncio.Lock, build) -> None:
     try:
-        results.extend(_read_json(FOOD_FILE))
-    except HTTPException:
-        pass
-    # CSV pantries
-    results.extend(_read_pantries_csv())
-    return results
+        async with lock:
+            await build()
+    except Exception as exc:
+        print("[refdata] refresh failed:", exc)
+
 
+async def _refresh_loop() -> None:
+    while True:
+        # Both upstream layers are fetched side by side
+        await asyncio.gather(_refresh(_shelters_lock, _build_shelters), _refresh(_food_lock, _build_food))
+        await asyncio.sleep(_REFRESH_EVERY)
 
+
+def start_refresh() -> None:
+    global _refresh_task
+    if _refresh_task is None:
+        _refresh_task = asyncio.create_task(_refresh_loop())
+
+
+async def stop_refresh() -> None:
+    global _refresh_task
+    if _refresh_task is not None:
+        _refresh_task.cancel()
+        try:
+            await _refresh_task
+        except asyncio.CancelledError:
+            pass
+        _refresh_task = None
+
+
+async def get_shelters(nocache: bool = False) -> List[Dict[str, Any]]:
+    """Merged remote + local shelters (pre-built by the refresh loop)."""
+    if nocache or _stale(_merged_shelters):
+        # Single-flight: waiters reuse the list built by whoever held the lock
+        async with _shelters_lock:
+            if nocache or _stale(_merged_shelters):
+                await _build_shelters(nocache)
+    return _merged_shelters.data
+
+
+async def get_food_sites() -> List[Dict[str, Any]]:
+    """Merged remote + local + CSV food sites (pre-built by the refresh loop)."""
+    if _stale(_merged_food):
+        async with _food_lock:
+            if _stale(_merged_food):
+                await _build_food()
+    return _merged_food.data
+
+
+@router.get("/shelters")
+async def list_shelters(request: Request, nocache: bool = False):
+    await get_shelters(nocache)
+    return json_response(request, _merged_shelters.body, _merged_shelters.etag, _REFRESH_EVERY, gzipped=_merged_shelters.gzip)
+
+
+@router.get("/food")
+async def list_food_sites(request: Request):
+    await get_food_sites()
+    return json_response(request, _merged_food.body, _merged_food.etag, _REFRESH_EVERY, gzipped=_merged_food.gzip)
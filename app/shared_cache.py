@@ -0,0 +1,74 @@
+import os
+import time
+from typing import Any, Optional, Tuple
+
+try:
+    import redis.asyncio as aioredis
+except Exception:
+    aioredis = None
+
+
+# Optional cross-worker cache. Without REDIS_URL every helper is a no-op and
+# callers keep using their in-process caches only.
+_client: Any = None
+
+
+def get_redis():
+    global _client
+    if _client is None and aioredis is not None:
+        url = os.getenv("REDIS_URL")
+        if url:
+            # Short timeouts: a hung Redis must fall back to in-process state, not block requests
+            _client = aioredis.Redis.from_url(url, socket_connect_timeout=0.5, socket_timeout=1.0)
+    return _client
+
+
+async def close_redis() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def get_entry(key: str) -> Optional[Tuple[float, str, bytes]]:
+    """(fetched_at, etag, body) stored by set_entry, or None."""
+    r = get_redis()
+    if r is None:
+        return None
+    try:
+        raw = await r.get(key)
+    except Exception as exc:
+        print("[cache] redis get error:", exc)
+        return None
+    if not raw:
+        return None
+    ts, etag, body = raw.split(b"\n", 2)
+    return float(ts), etag.decode("ascii"), body
+
+
+async def set_entry(key: str, body: bytes, etag: str, ttl: int, ts: Optional[float] = None) -> None:
+    r = get_redis()
+    if r is None:
+        return
+    header = f"{ts if ts is not None else time.time()}\n{etag}\n".encode("ascii")
+    try:
+        await r.set(key, header + body, ex=ttl)
+    except Exception as exc:
+        print("[cache] redis set error:", exc)
+
+
+async def incr_window(key: str, window: int) -> Optional[int]:
+    """Count a hit in a fixed window shared by all workers; None without Redis."""
+    r = get_redis()
+    if r is None:
+        return None
+    try:
+        # SET NX starts the window (and its TTL) once; INCR keeps the TTL
+        async with r.pipeline(transaction=True) as pipe:
+            pipe.set(key, 0, ex=window, nx=True)
+            pipe.incr(key)
+            _, count = await pipe.execute()
+    except Exception as exc:
+        print("[cache] redis incr error:", exc)
+        return None
+    return int(count)
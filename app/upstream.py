@@ -0,0 +1,27 @@
+from typing import Optional
+
+import httpx
+
+
+# One pooled keep-alive client for all upstream calls (ArcGIS, 311, WMS), so
+# TCP/TLS setup is paid once per host rather than once per request. Callers
+# pass their own per-call timeout.
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=True,
+            timeout=20,
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+        )
+    return _client
+
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
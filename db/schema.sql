@@ -21,6 +21,11 @@ alter table if exists pins add column if not exists urgency smallint not null de
 create index if not exists idx_pins_kind_created on pins(kind, created_at desc);
 create index if not exists idx_pins_expires_at on pins(expires_at);
 create index if not exists idx_pins_geo on pins(lat, lng);
+-- Hot /api/pins query: visible pins newest first, limit 500. Ordered by created_at
+-- alone so kind = any(...) with several kinds is still a filter on an ordered scan.
+-- Partial on is_hidden only; now() is not immutable so expires_at stays a filter.
+create index if not exists idx_pins_active_created on pins(created_at desc) where is_hidden = false;
+create index if not exists idx_pins_categories_gin on pins using gin(categories);
 
 create table if not exists comments (
     id uuid primary key default gen_random_uuid(),
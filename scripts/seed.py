@@ -3,7 +3,8 @@ import sys
 import os
 from datetime import datetime, timedelta, timezone
 import random
-import json
+
+import orjson
 from dotenv import load_dotenv
 
 # Windows + psycopg async needs Selector policy (Proactor not supported)
@@ -31,36 +32,34 @@ async def main():
     # load .env so DATABASE_URL is available when not set in shell
     load_dotenv()
     db_url = os.environ["DATABASE_URL"]
+    # Same expiry for every seeded row
+    expires = datetime.now(timezone.utc) + timedelta(hours=48)
+    pins = []
+    # load mock pins if available
+    try:
+        root = os.path.dirname(os.path.dirname(__file__))
+        mock_path = os.path.join(root, 'data', 'pins_mock.json')
+        if os.path.exists(mock_path):
+            with open(mock_path, 'rb') as f:
+                mock = orjson.loads(f.read())
+            for m in mock:
+                pins.append((m['kind'], m['categories'], m.get('title'), m['body'], m['lat'], m['lng']))
+    except Exception:
+        pass
+    pins.extend(NEEDS + OFFERS)
+    authors = [f"seed-{n}" for n in random.choices(range(100, 1000), k=len(pins))]
+    rows = [[*pin, author, expires] for pin, author in zip(pins, authors)]
     async with await psycopg.AsyncConnection.connect(db_url) as conn:
         async with conn.cursor() as cur:
-            # load mock pins if available
-            try:
-                root = os.path.dirname(os.path.dirname(__file__))
-                mock_path = os.path.join(root, 'data', 'pins_mock.json')
-                if os.path.exists(mock_path):
-                    mock = json.load(open(mock_path, 'r', encoding='utf-8'))
-                    for m in mock:
-                        expires = datetime.now(timezone.utc) + timedelta(hours=48)
-                        await cur.execute(
-                            """
-                            insert into pins (kind, categories, title, body, lat, lng, author_anon_id, expires_at)
-                            values (%s,%s,%s,%s,%s,%s,%s,%s)
-                            on conflict do nothing
-                            """,
-                            [m['kind'], m['categories'], m.get('title'), m['body'], m['lat'], m['lng'], f"seed-{random.randint(100,999)}", expires],
-                        )
-            except Exception:
-                pass
-            for kind, cats, title, body, lat, lng in NEEDS + OFFERS:
-                expires = datetime.now(timezone.utc) + timedelta(hours=48)
-                await cur.execute(
-                    """
-                    insert into pins (kind, categories, title, body, lat, lng, author_anon_id, expires_at)
-                    values (%s,%s,%s,%s,%s,%s,%s,%s)
-                    on conflict do nothing
-                    """,
-                    [kind, cats, title, body, lat, lng, f"seed-{random.randint(100,999)}", expires],
-                )
+            # executemany runs in pipeline mode: one round-trip for the whole batch
+            await cur.executemany(
+                """
+                insert into pins (kind, categories, title, body, lat, lng, author_anon_id, expires_at)
+                values (%s,%s,%s,%s,%s,%s,%s,%s)
+                on conflict do nothing
+                """,
+                rows,
+            )
         await conn.commit()
     print("Seeded pins.")
 